@@ -8,10 +8,10 @@
 
 from argparse import ArgumentParser
 from subprocess import Popen, PIPE, DEVNULL, run
-from io import StringIO
 import csv
 import shlex
 import shutil
+import sys
 
 def main() -> None:
     parser = ArgumentParser()
@@ -29,6 +29,10 @@ def main() -> None:
 
 
 class Ripper:
+    def __init__(self) -> None:
+        self.__drives: dict[str, list[str]] | None = None
+        self.__last_progress = ""
+
     def backup(self, device: str, dvd: bool = False) -> None:
         filename = self.__get_filename(device, dvd)
 
@@ -43,47 +47,59 @@ class Ripper:
             f"./{filename}"
         ]
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        print(shlex.join(command))
 
         with Popen(command, stdout=PIPE, stderr=DEVNULL) as p:
-            while True:
-                if p.poll() is not None:
-                    break
-
-                if p.stdout:
-                    line = p.stdout.readline().decode().strip()
-                    prefix, _, line = line.partition(":")
+            if p.stdout:
+                for line in p.stdout:
+                    prefix, _, line = line.decode().strip().partition(":")
                     self.__handle_progress(prefix, line)
-                
+
+            p.wait()
+
         print("\nDone.")
 
     def __get_filename(self, device: str, dvd: bool) -> str:
-        command = ["makemkvcon", "-r", "info", "disc:9999"]
-        command_output = run(command, stdout=PIPE, stderr=DEVNULL).stdout.decode()
-
-        for line in command_output.splitlines():
-            if line.startswith(f"DRV:{device}"):
-                filename = self.__csv_split(line)[5]
-                if dvd:
-                    filename += ".iso"
-                
-                return filename
-        else:
+        drive = self.__get_drives().get(device)
+        if not drive:
             exit("Dang")
 
+        filename = drive[5]
+        if dvd:
+            filename += ".iso"
+
+        return filename
+
+    def __get_drives(self) -> dict[str, list[str]]:
+        # Probing the drives spins up every disc, so only do it once
+        if self.__drives is None:
+            command = ["makemkvcon", "-r", "info", "disc:9999"]
+            command_output = run(command, stdout=PIPE, stderr=DEVNULL).stdout.decode()
+
+            self.__drives = {}
+            for line in command_output.splitlines():
+                prefix, _, line = line.partition(":")
+                if prefix == "DRV":
+                    drive = self.__csv_split(line)
+                    self.__drives[drive[0]] = drive
+
+        return self.__drives
+
     def __handle_progress(self, prefix, line):
         if prefix == "PRGT":
             _, _, message = self.__csv_split(line)
             print(message)
         elif prefix == "PRGV":
-            _, total, max = [ int(x) for x in self.__csv_split(line) ]
-            progress = total / max * 100
-            print(f"Progress: {progress:.2f}%", end="\r")
+            # PRGV is always three plain integers, so skip the csv module
+            _, total, max = line.split(",", 2)
+            progress = f"Progress: {int(total) / int(max) * 100:.2f}%\r"
+            if progress != self.__last_progress:
+                self.__last_progress = progress
+                sys.stdout.write(progress)
+                sys.stdout.flush()
     
     def __csv_split(self, string):
-        with StringIO(string) as s:
-            reader = csv.reader(s)
-            return next(reader)
+        return next(csv.reader([string]))
 
 
 if __name__ == "__main__":
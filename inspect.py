@@ -6,24 +6,33 @@ import os
 import pprint
 import sys
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from functools import partial
 from pathlib import Path
-from subprocess import DEVNULL, PIPE, run, CalledProcessError
+from subprocess import DEVNULL, PIPE, run, CalledProcessError, TimeoutExpired
 from sys import exit
+from threading import Lock
 import pickle
 
+HDR10_PRIMARIES = frozenset({"red_x", "red_y", "green_x", "green_y", "blue_x", "blue_y", "white_point_x", "white_point_y"})
+HDR10_LUMINANCE = frozenset({"min_luminance", "max_luminance"})
+MKVMERGE_WORKERS = 4
+
 
 def main():
     parser = ArgumentParser()
     parser.add_argument("file")
     parser.add_argument("--debug", action="store_true")
     parser.add_argument("--deep", action="store_true")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for ffprobe to read a file's header")
 
     args = parser.parse_args()
 
     inspector = Inspector()
     inspector.debug = args.debug
     inspector.deep_inspect = args.deep
+    inspector.timeout = args.timeout
     inspector.inspect(args.file)
 
 
@@ -31,6 +40,11 @@ class Inspector:
     def __init__(self):
         self.debug = False
         self.deep_inspect = False
+        self.timeout = 30
+        self.__probe_executor = None
+        self.__segment_probes = {}
+        self.__segment_probes_lock = Lock()
+        self.__current_cache_keys = {}
 
     def inspect(self, file):
         if not os.path.exists(file):
@@ -41,15 +55,18 @@ class Inspector:
         
         self.__verify_tools()
 
-        if file.endswith("bdmv"):
-            return self.__bluray_inspect(file)
-        elif file.endswith("mpls"):
-            return self.__mpls_inspect(file)
-        else:
-            return self.__single_file_inspect(file)
+        inspect_by_suffix = {".bdmv": self.__bluray_inspect, ".mpls": self.__mpls_inspect}
+        return inspect_by_suffix.get(Path(file).suffix.lower(), self.__single_file_inspect)(file)
 
     def __single_file_inspect(self, file):
-        format_info, stream_info, frame_info = self.__ffprobe(file)
+        probe = self.__ffprobe(file)
+        if probe is None:
+            exit(f"Unable to inspect {file}")
+
+        format_info, stream_info, frame_info = probe
+        if frame_info is None:
+            frame_info = {}
+
         if self.debug:
             print(f"Format info: \n{pprint.pformat(format_info)}\n\n")
             print(f"Stream info: \n{pprint.pformat(stream_info)}\n\n")
@@ -71,15 +88,17 @@ class Inspector:
 
     def __bluray_inspect(self, file):
         cache_file, ffprobe_cache = self.__get_ffprobe_cache(file)
+        cached_count = len(ffprobe_cache)
 
-        playlist_info = dict()
         playlist_folder = Path(file).parent / "PLAYLIST"
-        for playlist in playlist_folder.glob("*.mpls"):
-            inspection_result = self.__inspect_mpls(ffprobe_cache, playlist)
-            playlist_info[playlist] = inspection_result
+        playlists = list(playlist_folder.glob("*.mpls"))
+        inspection_results = self.__inspect_playlists(ffprobe_cache, playlists)
+        playlist_info = {playlist: result for playlist, result in zip(playlists, inspection_results) if result is not None}
 
-        with open(cache_file, "wb") as f:
-            pickle.dump(ffprobe_cache, f)
+        # Every playlist was read, so any segment none of them use is gone from the disc
+        pruned = self.__prune_ffprobe_cache(ffprobe_cache, drop_unused=True)
+        if pruned or len(ffprobe_cache) != cached_count:
+            self.__save_ffprobe_cache(cache_file, ffprobe_cache)
 
         for key in sorted(playlist_info, key=lambda k: playlist_info[k].video[0].duration):
             print(key)
@@ -87,23 +106,29 @@ class Inspector:
 
     def __mpls_inspect(self, file):
         cache_file, ffprobe_cache = self.__get_ffprobe_cache(file)
-        inspection_result = self.__inspect_mpls(ffprobe_cache, file)
-        try:
-            with open(cache_file, "wb") as f:
-                pickle.dump(ffprobe_cache, f)
-        except OSError as e:
-            print(f"Failed to save cache file: {e}", file=sys.stderr)
+        cached_count = len(ffprobe_cache)
+        inspection_result, = self.__inspect_playlists(ffprobe_cache, [file])
+        pruned = self.__prune_ffprobe_cache(ffprobe_cache, drop_unused=False)
+        if pruned or len(ffprobe_cache) != cached_count:
+            try:
+                self.__save_ffprobe_cache(cache_file, ffprobe_cache)
+            except OSError as e:
+                print(f"Failed to save cache file: {e}", file=sys.stderr)
+
+        if inspection_result is None:
+            exit(f"Unable to inspect {file}")
 
         print(inspection_result)
 
     def __get_ffprobe_cache(self, file):
-        if file.endswith("bdmv"):
-            cache_file = Path(file).parent.parent / "ffprobe_cache"
-        elif file.endswith("mpls"):
-            cache_file = Path(file).parent.parent.parent / "ffprobe_cache"
-        else:
+        # The cache lives in the disc's root folder, above BDMV
+        path = Path(file)
+        cache_folder = {".bdmv": path.parent.parent, ".mpls": path.parent.parent.parent}.get(path.suffix.lower())
+        if cache_folder is None:
             exit("Unexpected file for ffprobe_cache")
 
+        cache_file = cache_folder / "ffprobe_cache"
+
         if cache_file.exists():
             with open(cache_file, "rb") as f:
                 try:
@@ -115,6 +140,33 @@ class Inspector:
             ffprobe_cache = dict()
         return cache_file, ffprobe_cache
 
+    def __prune_ffprobe_cache(self, ffprobe_cache, drop_unused):
+        # Drops entries from older cache formats and for segments that have since changed on disk
+        stale_keys = [key for key in ffprobe_cache
+                      if not isinstance(key, tuple)
+                      or (key[0] in self.__current_cache_keys and self.__current_cache_keys[key[0]] != key)
+                      or (drop_unused and key[0] not in self.__current_cache_keys)]
+        for key in stale_keys:
+            del ffprobe_cache[key]
+
+        return bool(stale_keys)
+
+    @staticmethod
+    def __save_ffprobe_cache(cache_file, ffprobe_cache):
+        temp_file = cache_file.with_suffix(".tmp")
+        with open(temp_file, "wb") as f:
+            pickle.dump(ffprobe_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+
+    def __inspect_playlists(self, ffprobe_cache, playlists):
+        self.__segment_probes = {}
+        self.__current_cache_keys = {}
+        # Segments are probed side by side, but with no more ffprobes than there are cores
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as probe_executor, \
+                ThreadPoolExecutor(max_workers=MKVMERGE_WORKERS) as playlist_executor:
+            self.__probe_executor = probe_executor
+            return list(playlist_executor.map(partial(self.__inspect_mpls, ffprobe_cache), playlists))
+
     def __inspect_mpls(self, ffprobe_cache, playlist):
         command = ["mkvmerge", "-J", str(playlist)]
         mkvmerge_info = json.loads(run(command, stdout=PIPE).stdout)
@@ -129,29 +181,39 @@ class Inspector:
             elif track["type"] == "subtitles":
                 all_subtitle_mkvmerge_info.append(track)
 
-        for segment in set(mkvmerge_info["container"]["properties"]["playlist_file"]):
-            segment = str(Path(segment).relative_to(Path(playlist).parent.parent.parent.absolute()))
-            if segment in ffprobe_cache:
-                format_info, stream_info, frame_info = ffprobe_cache[segment]
+        disc_root = Path(playlist).parent.parent.parent.absolute()
+        segments = [str(Path(segment).relative_to(disc_root))
+                    for segment in set(mkvmerge_info["container"]["properties"]["playlist_file"])]
+
+        cache_keys = {segment: self.__get_cache_key(disc_root, segment) for segment in segments}
+        self.__current_cache_keys.update(cache_keys)
+        segment_info = {segment: ffprobe_cache[cache_keys[segment]] for segment in segments if cache_keys[segment] in ffprobe_cache}
+        uncached_segments = [segment for segment in segments if segment not in segment_info]
+        probes = [self.__probe_segment(disc_root, segment, cache_keys[segment]) for segment in uncached_segments]
+        for segment, probe in zip(uncached_segments, probes):
+            probe_result = probe.result()
+            if probe_result is None:
+                return None
+
+            format_info, stream_info, frame_info = probe_result
+            if frame_info is None:
+                # The first frame couldn't be read in time, so probe this segment again next run
+                segment_info[segment] = (format_info, stream_info, {})
             else:
-                format_info, stream_info, frame_info = self.__ffprobe(segment)
-                if self.deep_inspect:
-                    subtitle_stats = self.__read_track_statistics(segment)
-                    stream_info[:] = [stream for stream in stream_info if stream["codec_type"] != "subtitle"]
-                    stream_info.extend(subtitle_stats)
-                ffprobe_cache[segment] = (format_info, stream_info, frame_info)
+                segment_info[segment] = ffprobe_cache[cache_keys[segment]] = (format_info, stream_info, frame_info)
 
+        for segment in segments:
+            format_info, stream_info, frame_info = segment_info[segment]
             all_format_info.append(format_info)
             all_stream_info.append(stream_info)
             all_frame_info.append(frame_info)
 
         # all_stream_info is a 2d matrix
         # [ [seg1_vid1, seg1_aud1, seg1_aud2, seg1_sub1], [seg2_vid1, seg2_aud1, seg2_aud2, seg2_sub1] ]
-        # We need to rotate it counter-clockwise, so it looks like this:
+        # We need to transpose it, so it looks like this:
         # [ [seg1_vid1, seg2_vid1], [seg1_aud1, seg2_aud1], [seg1_aud2, seg2_aud2], [seg1_sub1, seg2_sub1] ]
-        all_stream_info[:] = list(zip(*all_stream_info))[::-1]
-        # sort by stream index, so everything's in the right order
-        all_stream_info.sort(key=lambda x: x[0]["index"])
+        # sorted by stream index, so everything's in the right order
+        all_stream_info = sorted(zip(*all_stream_info), key=lambda x: x[0]["index"])
         inspection_result = InspectionResult()
         audio_index = 0
         subtitle_index = 0
@@ -169,6 +231,28 @@ class Inspector:
 
         return inspection_result
 
+    @staticmethod
+    def __get_cache_key(disc_root, segment):
+        # A re-ripped disc reuses the same segment names, so also key on size and modification time
+        stat = os.stat(disc_root / segment)
+        return segment, stat.st_mtime_ns, stat.st_size
+
+    def __probe_segment(self, disc_root, segment, cache_key):
+        # Playlists often share segments, so reuse a probe that another playlist has already started
+        with self.__segment_probes_lock:
+            if cache_key not in self.__segment_probes:
+                self.__segment_probes[cache_key] = self.__probe_executor.submit(self.__run_segment_probe, str(disc_root / segment))
+            return self.__segment_probes[cache_key]
+
+    def __run_segment_probe(self, segment_path):
+        probe = self.__ffprobe(segment_path)
+        if probe is not None and self.deep_inspect:
+            format_info, stream_info, frame_info = probe
+            subtitle_stats = self.__read_track_statistics(segment_path)
+            stream_info[:] = [stream for stream in stream_info if stream["codec_type"] != "subtitle"]
+            stream_info.extend(subtitle_stats)
+        return probe
+
     @staticmethod
     def __verify_tools():
         commands = [["ffprobe", "-version"], ["mkvmerge", "--version"]]
@@ -178,28 +262,23 @@ class Inspector:
             except FileNotFoundError or CalledProcessError:
                 exit(f"Unable to run {command[0]}")
 
-    @staticmethod
-    def __ffprobe(input_file):
+    def __ffprobe(self, input_file):
         command = [
             "ffprobe",
             "-loglevel", "quiet",
             "-show_streams",
-            "-print_format", "json",
-            input_file
-        ]
-
-        stream_info = json.loads(run(command, stdout=PIPE, stderr=DEVNULL).stdout)
-
-        command = [
-            "ffprobe",
-            "-loglevel", "quiet",
             "-show_format",
             "-print_format", "json",
             input_file
         ]
 
-        format_info = json.loads(run(command, stdout=PIPE, stderr=DEVNULL).stdout)
+        try:
+            container_info = json.loads(run(command, stdout=PIPE, stderr=DEVNULL, timeout=self.timeout).stdout)
+        except TimeoutExpired:
+            print(f"Timed out probing {input_file}", file=sys.stderr)
+            return None
 
+        # -select_streams would also filter -show_streams, so the frame probe has to be its own call
         command = [
             "ffprobe",
             "-loglevel", "quiet",
@@ -210,9 +289,14 @@ class Inspector:
             input_file
         ]
 
-        frame_info = json.loads(run(command, stdout=PIPE, stderr=DEVNULL).stdout)
+        try:
+            frame_info = json.loads(run(command, stdout=PIPE, stderr=DEVNULL, timeout=self.timeout).stdout)["frames"][0]
+        except TimeoutExpired:
+            # The first frame is only used to spot HDR, so it's not worth failing the whole inspection over
+            print(f"Timed out reading the first frame of {input_file}", file=sys.stderr)
+            frame_info = None
 
-        return format_info["format"], stream_info["streams"], frame_info["frames"][0]
+        return container_info["format"], container_info["streams"], frame_info
 
     @staticmethod
     def __read_track_statistics(input_file) -> list:
@@ -225,6 +309,7 @@ class Inspector:
             "-print_format", "json",
             input_file]
 
+        # Counting frames reads the whole segment, so this one isn't subject to the timeout
         ffprobe_result = json.loads(run(command, stdout=PIPE, stderr=DEVNULL).stdout)
 
         return ffprobe_result["streams"]
@@ -274,9 +359,7 @@ class Video:
         video.bitrate = get_bitrate(stream_info.get("tags", {}))
         video.hdr = Video._is_hdr(stream_info, frame_info)
         video.hlg = Video._is_hlg(frame_info)
-        video.hdr10 = Video._is_hdr10(frame_info)
-        video.hdr10plus = Video._is_hdr10_plus(frame_info)
-        video.dolbyvision = Video._is_dolby_vision(stream_info)
+        video.hdr10, video.hdr10plus, video.dolbyvision = Video._classify_side_data(stream_info, frame_info)
 
         return video
 
@@ -290,9 +373,7 @@ class Video:
         video.duration = sum([float(info["duration"]) for info in all_format_info])
         video.hdr = Video._is_hdr(stream[0], all_frame_info[0])
         video.hlg = Video._is_hlg(all_frame_info[0])
-        video.hdr10 = Video._is_hdr10(all_frame_info[0])
-        video.hdr10plus = Video._is_hdr10(all_frame_info[0])
-        video.dolbyvision = Video._is_dolby_vision(stream[0])
+        video.hdr10, video.hdr10plus, video.dolbyvision = Video._classify_side_data(stream[0], all_frame_info[0])
 
         return video
 
@@ -319,34 +400,26 @@ class Video:
         return frame_info.get("color_transfer", "unknown") == "arib-std-b67"
 
     @staticmethod
-    def _is_hdr10(frame_info):
-        for side_data in frame_info.get("side_data_list", []):
-            if side_data["side_data_type"] == "Mastering display metadata":
-                has_primaries = {"red_x", "red_y", "green_x", "green_y", "blue_x", "blue_y", "white_point_x", "white_point_y"}\
-                    .issubset(side_data.keys())
-                has_luminance = {"min_luminance", "max_luminance"}.issubset(side_data.keys())
-
-                return has_primaries and has_luminance
-        else:
-            return False
-
-    @staticmethod
-    def _is_hdr10_plus(frame_info):
+    def _classify_side_data(stream_info, frame_info):
+        # Returns (hdr10, hdr10plus, dolbyvision)
+        hdr10 = None
+        hdr10plus = False
         for side_data in frame_info.get("side_data_list", []):
-            if side_data["side_data_type"] == "HDR Dynamic Metadata SMPTE2094-40 (HDR10+)":
-                return True
-        else:
-            return False
+            side_data_type = side_data["side_data_type"]
+            if side_data_type == "Mastering display metadata" and hdr10 is None:
+                hdr10 = HDR10_PRIMARIES.issubset(side_data.keys()) and HDR10_LUMINANCE.issubset(side_data.keys())
+            elif side_data_type == "HDR Dynamic Metadata SMPTE2094-40 (HDR10+)":
+                hdr10plus = True
 
-    @staticmethod
-    def _is_dolby_vision(stream_info):
+        dolbyvision = None
         for side_data in stream_info.get("side_data_list", []):
             if side_data["side_data_type"] == "DOVI configuration record":
                 profile = side_data.get("dv_profile", "unknown profile")
                 signal_compat_id = side_data.get("dv_bl_signal_compatibility_id", "unknown")
-                return f"Dolby Vision {profile}.{signal_compat_id}"
-        else:
-            return None
+                dolbyvision = f"Dolby Vision {profile}.{signal_compat_id}"
+                break
+
+        return bool(hdr10), hdr10plus, dolbyvision
 
 
 class Audio:
@@ -21,7 +21,8 @@ class BatchTranscoder:
     def __init__(self, input_folder: Path, monitor_input: bool, transcode_command) -> None:
         self.input_folder = input_folder
         self.monitor_input = monitor_input
-        self.seen_files = []
+        self.seen_files = set()
+        self.probe_cache = {}
         self.transcode_command = transcode_command if transcode_command else ["transcode.py", "--crop", "auto"]
         self.queue = asyncio.Queue()
 
@@ -33,12 +34,17 @@ class BatchTranscoder:
             for i in range(num_workers):
                 tg.create_task(self.worker(f"worker-{i}"))
 
-        await self.validate_duration()
+        await self.validate_duration(num_workers)
 
 
     async def worker(self, name: str):
-        while not self.queue.empty():
-            file, cwd = await self.queue.get()
+        while True:
+            # Take work without waiting, so a worker finishes as soon as the queue runs dry
+            try:
+                file, cwd = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
             print(f"{name} is transcoding {file}...")
             await self.transcode_file(file, cwd)
             if self.monitor_input:
@@ -49,7 +55,7 @@ class BatchTranscoder:
     async def fill_queue(self):
         for file in self.input_folder.rglob("*.mkv"):
             if file not in self.seen_files:
-                self.seen_files.append(file)
+                self.seen_files.add(file)
                 cwd = file.relative_to(self.input_folder).parent
                 await self.queue.put((file, cwd))
         
@@ -79,33 +85,39 @@ class BatchTranscoder:
                     print(f"WARNING: {input_file} and {output_file} have different durations! {input_duration} vs {output_duration}")
                 validation_queue.task_done()
 
-        for file in self.input_folder.rglob("*.mkv"):
+        # fill_queue has already walked the input folder
+        for file in sorted(self.seen_files):
             await validation_queue.put(file)
 
-        with asyncio.TaskGroup() as tg:
+        async with asyncio.TaskGroup() as tg:
             for _ in range(num_workers):
                 tg.create_task(do_validate())
 
 
     async def is_hd(self, input_file):
-            command = [
-                "ffprobe",
-                "-loglevel", "quiet",
-                "-show_streams",
-                "-show_format",
-                "-print_format", "json",
-                input_file
-            ]
-
-            process = await asyncio.create_subprocess_exec(*command, stdout=PIPE, stderr=DEVNULL)
-            output, _ = await process.communicate()
-            media_info = json.loads(output)
-
-            video = [ x for x in media_info["streams"] if x["codec_type"] == "video" ][0]
-
-            return video["width"] >= 1280
+        media_info = await self.probe(input_file)
+        video = [ x for x in media_info["streams"] if x["codec_type"] == "video" ][0]
+
+        return video["width"] >= 1280
     
     async def get_file_duration(self, file):
+        media_info = await self.probe(file)
+
+        return float(media_info.get("format", {}).get("duration", 0))
+
+    async def probe(self, file: Path):
+        # Inputs are probed before transcoding and again during validation, so remember the result
+        # for as long as the file's size and modification time are unchanged
+        try:
+            stat = file.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+
+        cached = self.probe_cache.get(file)
+        if signature and cached and cached[0] == signature:
+            return cached[1]
+
         command = [
             "ffprobe",
             "-loglevel", "quiet",
@@ -119,7 +131,10 @@ class BatchTranscoder:
         output, _ = await process.communicate()
         media_info = json.loads(output)
 
-        return float(media_info.get("format", {}).get("duration", 0))
+        if signature:
+            self.probe_cache[file] = (signature, media_info)
+
+        return media_info
 
 
 if __name__ == "__main__":
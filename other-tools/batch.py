@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 from argparse import ArgumentParser
 from subprocess import run
 
@@ -8,24 +9,23 @@ parser.add_argument("queue")
 
 args, other_args = parser.parse_known_args()
 
-while True:
-    with open(args.queue, "r") as queue:
-        items = queue.readlines()
-
-    if items:
-        item = items[0].strip()
+with open(args.queue, "r") as queue:
+    items = queue.readlines()
 
-    if not item or not items:
-        break
+while items and items[0].strip():
+    item = items[0].strip()
 
     command = ["hevc-encode", item, *other_args]
-    run(command, shell=True).check_returncode()
+    run(command).check_returncode()
 
+    # Re-read the queue, as it may have been edited while that item was encoding
     with open(args.queue, "r") as queue:
         items = queue.readlines()
 
     if items and items[0].strip() == item:
         items = items[1:]
 
-    with open(args.queue, "w") as queue:
-        queue.writelines(items)
\ No newline at end of file
+    # Swap the new queue in with a rename, so it's never left half-written
+    with open(f"{args.queue}.tmp", "w") as queue:
+        queue.writelines(items)
+    os.replace(f"{args.queue}.tmp", args.queue)
@@ -2,8 +2,12 @@
 
 import json
 import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import run, PIPE, DEVNULL
 
+CACHE_FILE = "generate_queue_cache"
+
 
 def main():
     queuemaker = QueueMaker()
@@ -11,59 +15,70 @@ def main():
 
 
 class QueueMaker:
+    def __init__(self):
+        self.ffprobe_cache = {}
+
     def run(self):
         library_location = "X:\Plex Library\Films"
         source_locations = ["D:\Films", "E:\Films", "F:\Films", "G:\Films"]
 
+        self.load_ffprobe_cache()
+        cached_count = len(self.ffprobe_cache)
+
         library_info = self.get_library_info(library_location)
 
         not_in_library = []
         needs_ripping = []
         needs_transcoding = []
         done = []
+        in_library = []
 
         for source in source_locations:
             for root, _, files in os.walk(source):
                 for file in files:
-                    if file[-3:] == "mkv":
+                    if file.endswith(".mkv"):
                         full_path = os.path.join(root, file)
                         film_name = os.path.splitext(os.path.basename(file))[0]
 
                         if film_name not in library_info:
                             not_in_library.append(full_path)
                         else:
-                            transcoded_vcodec, transcoded_acodec = library_info.pop(film_name)
-                            media_info = self.scan_media(full_path)
-                            audio_codec = [ x for x in media_info["streams"] if x["codec_type"] == "audio"][0]["codec_name"]
-
-                            if audio_codec == "flac":
-                                needs_ripping.append(full_path)
-                            else:
-                                if transcoded_vcodec != "hevc" or (audio_codec != "ac3" and transcoded_acodec != "eac3"):
-                                    needs_transcoding.append(full_path)
-                                else:
-                                    done.append(full_path)
-
+                            in_library.append((full_path, library_info.pop(film_name)))
+
+        all_media_info = self.scan_all_media([full_path for full_path, _ in in_library])
+        for (full_path, (transcoded_vcodec, transcoded_acodec)), media_info in zip(in_library, all_media_info):
+            audio_codec = self.get_codecs(media_info)["audio"]
+
+            if audio_codec == "flac":
+                needs_ripping.append(full_path)
+            else:
+                if transcoded_vcodec != "hevc" or (audio_codec != "ac3" and transcoded_acodec != "eac3"):
+                    needs_transcoding.append(full_path)
+                else:
+                    done.append(full_path)
+
+        if len(self.ffprobe_cache) != cached_count:
+            self.save_ffprobe_cache()
         
         if not_in_library:
             with open("not_in_library.txt", "w") as f:
-                f.writelines(self.add_line_endings(not_in_library))
+                f.write("\n".join(not_in_library) + "\n")
 
         if needs_ripping:
             with open("needs_ripping.txt", "w") as f:
-                f.writelines(self.add_line_endings(needs_ripping))
+                f.write("\n".join(needs_ripping) + "\n")
 
         if needs_transcoding:
             with open("needs_transcoding.txt", "w") as f:
-                f.writelines(self.add_line_endings(needs_transcoding))
+                f.write("\n".join(needs_transcoding) + "\n")
 
         if done:
             with open("done.txt", "w") as f:
-                f.writelines(self.add_line_endings(done))
+                f.write("\n".join(done) + "\n")
 
         if library_info:
             with open("needs_buying.txt", "w") as f:
-                f.writelines(self.add_line_endings(library_info.keys()))
+                f.write("\n".join(library_info.keys()) + "\n")
 
         print("Done")
 
@@ -71,39 +86,68 @@ class QueueMaker:
     def get_library_info(self, library_location):
         library_info = {}
 
-        for root, _, files in os.walk(library_location):
-            for file in files:
-                if file[-3:] in ["mkv", "mp4", "m4v"]:
-                    full_path = os.path.join(root, file)
-                    film_name = os.path.splitext(os.path.basename(file))[0]
-                    media_info = self.scan_media(full_path)
+        library_files = [os.path.join(root, file)
+                         for root, _, files in os.walk(library_location)
+                         for file in files if file.endswith((".mkv", ".mp4", ".m4v"))]
 
-                    video_codec = [ x for x in media_info["streams"] if x["codec_type"] == "video" ][0]["codec_name"]
-                    audio_codec = [ x for x in media_info["streams"] if x["codec_type"] == "audio"][0]["codec_name"]
+        for full_path, media_info in zip(library_files, self.scan_all_media(library_files)):
+            film_name = os.path.splitext(os.path.basename(full_path))[0]
 
-                    library_info[film_name] = (video_codec, audio_codec)
+            codecs = self.get_codecs(media_info)
+            library_info[film_name] = (codecs["video"], codecs["audio"])
 
         return library_info
 
 
+    def scan_all_media(self, files):
+        # ffprobe spends most of its time waiting on the disk, so keep several running at once
+        with ThreadPoolExecutor() as executor:
+            return list(executor.map(self.scan_media, files))
+
+
+    def load_ffprobe_cache(self):
+        if os.path.exists(CACHE_FILE):
+            with open(CACHE_FILE, "rb") as f:
+                try:
+                    self.ffprobe_cache = pickle.load(f)
+                except Exception as e:
+                    print(e)
+
+
+    def save_ffprobe_cache(self):
+        with open(f"{CACHE_FILE}.tmp", "wb") as f:
+            pickle.dump(self.ffprobe_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{CACHE_FILE}.tmp", CACHE_FILE)
+
+
     def scan_media(self, file):
+        # Films rarely change once they're in the library, so reuse the last probe until their size or modification time does
+        stat = os.stat(file)
+        cache_key = (file, stat.st_size, stat.st_mtime_ns)
+        if cache_key in self.ffprobe_cache:
+            return self.ffprobe_cache[cache_key]
+
         command = [
             "ffprobe",
             "-loglevel", "quiet",
-            "-show_streams",
-            "-show_format",
+            "-show_entries", "stream=codec_type,codec_name",
             "-print_format", "json",
             file
         ]
 
         output = run(command, stdout=PIPE, stderr=DEVNULL).stdout
-        return json.loads(output)
-
-
-    def add_line_endings(self, lines):
-        for line in lines:
-            yield line
-            yield "\n"
+        media_info = json.loads(output)
+        self.ffprobe_cache[cache_key] = media_info
+        return media_info
+
+
+    def get_codecs(self, media_info):
+        # Only the first video and audio streams matter, so don't let later ones overwrite them
+        codecs = {}
+        for stream in media_info["streams"]:
+            if stream["codec_type"] in ("video", "audio"):
+                codecs.setdefault(stream["codec_type"], stream.get("codec_name"))
+        return codecs
 
 
 if __name__ == "__main__":
@@ -2,10 +2,13 @@
 
 import json
 import os
+import pickle
 from argparse import ArgumentParser
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import run, PIPE, DEVNULL
 
+CACHE_FILE = "library_info_cache"
 
 def main():
     parser = ArgumentParser()
@@ -15,15 +18,23 @@ def main():
 
     codecs = defaultdict(list)
     sizes = defaultdict(list)
-    for root, _, files in os.walk(args.library):
-        for file in map(lambda x: os.path.join(root, x), files):
-            media_info = scan_media(file)
+    library_files = [os.path.join(root, file) for root, _, files in os.walk(args.library) for file in files]
+
+    ffprobe_cache = load_ffprobe_cache()
+    cached_count = len(ffprobe_cache)
+
+    with ThreadPoolExecutor() as executor:
+        all_media_info = executor.map(lambda file: scan_media(file, ffprobe_cache), library_files)
+        for file, media_info in zip(library_files, all_media_info):
             codec = get_codec(media_info)
             size = get_dimensions(media_info)
 
             codecs[codec].append(file)
             sizes[size].append(file)
 
+    if len(ffprobe_cache) != cached_count:
+        save_ffprobe_cache(ffprobe_cache)
+
 
     for size in sizes:
         print(f"{size}: {len(sizes[size])}")
@@ -46,7 +57,29 @@ def get_dimensions(media_info):
         return "unknown"
 
 
-def scan_media(file):
+def load_ffprobe_cache():
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE, "rb") as f:
+            try:
+                return pickle.load(f)
+            except Exception as e:
+                print(e)
+
+    return {}
+
+
+def save_ffprobe_cache(ffprobe_cache):
+    with open(f"{CACHE_FILE}.tmp", "wb") as f:
+        pickle.dump(ffprobe_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{CACHE_FILE}.tmp", CACHE_FILE)
+
+
+def scan_media(file, ffprobe_cache):
+    stat = os.stat(file)
+    cache_key = (file, stat.st_size, stat.st_mtime_ns)
+    if cache_key in ffprobe_cache:
+        return ffprobe_cache[cache_key]
+
     command = ["ffprobe", 
                 "-loglevel", "quiet",
                 "-select_streams", "v:0",
@@ -56,7 +89,9 @@ def scan_media(file):
 
     result = run(command, stdout=PIPE, stderr=DEVNULL).stdout
 
-    return json.loads(result)
+    media_info = json.loads(result)
+    ffprobe_cache[cache_key] = media_info
+    return media_info
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 
-import collections
 import json
 import os
 from argparse import ArgumentParser
-from decimal import Decimal, ROUND_HALF_UP
+from array import array
 from fractions import Fraction
+from itertools import accumulate
+from operator import sub
 from multiprocessing import Pool
 from subprocess import run, DEVNULL, PIPE
 
-import math
-
 unit_base = 1000
 verbose = False
+shared_frame_sizes = None
 
 def main():
     parser = ArgumentParser()
@@ -52,23 +52,14 @@ def main():
         else:
             exit(f"--initial-buffer-fill must be a percentage or a value in seconds")
 
-    all_frame_sizes = []
-    bitrate_samples = []
-
     print("Reading file, this might take a while...")
-    media_info = scan_media(args.file)
-
-    fps = float(Fraction(media_info["streams"][0]["avg_frame_rate"]))
+    fps = get_frame_rate(args.file)
     rounded_fps = round(fps)
-    last_second_of_frame_sizes = collections.deque(maxlen=rounded_fps)
-
-    for packet in media_info["packets"]:
-        frame_size = int(packet["size"]) * 8 # ffmpeg counts in bytes, we want bits
-        last_second_of_frame_sizes.append(frame_size)
-        all_frame_sizes.append(frame_size)
+    all_frame_sizes = get_frame_sizes(args.file)
 
-        if len(last_second_of_frame_sizes) == rounded_fps:
-            bitrate_samples.append(sum(last_second_of_frame_sizes))
+    # Each sample is a second's worth of frames, which is the difference between two running totals
+    running_totals = list(accumulate(all_frame_sizes, initial=0))
+    bitrate_samples = [end - start for start, end in zip(running_totals, running_totals[rounded_fps:])]
 
     bitrate_samples.sort()
     max_bitrate = max(bitrate_samples)
@@ -92,18 +83,26 @@ def main():
 def get_network_requirements(frame_sizes, fps, buffer_sizes_mb, initial_buffer_fill, average_bitrate, max_bitrate):
     print("Simulating playback...")
 
-    args = [ (frame_sizes, fps, x, initial_buffer_fill, average_bitrate, max_bitrate) for x in buffer_sizes_mb ]
+    args = [ (fps, x, initial_buffer_fill, average_bitrate, max_bitrate) for x in buffer_sizes_mb ]
     if len(args) > 1 and not verbose:
-        with Pool(len(args)) as p:
+        # Each worker is given the frame sizes once, when it starts
+        with Pool(len(args), initializer=set_shared_frame_sizes, initargs=(frame_sizes,)) as p:
             network_speeds = p.map(get_network_requirements_impl, args)
     else:
+        set_shared_frame_sizes(frame_sizes)
         network_speeds = list(map(get_network_requirements_impl, args))
 
     return network_speeds
 
 
+def set_shared_frame_sizes(frame_sizes):
+    global shared_frame_sizes
+    shared_frame_sizes = frame_sizes
+
+
 def get_network_requirements_impl(args):
-    frame_sizes, fps, buffer_size_mb, initial_buffer_fill, average_bitrate, max_bitrate = args
+    fps, buffer_size_mb, initial_buffer_fill, average_bitrate, max_bitrate = args
+    frame_sizes = shared_frame_sizes
 
     buffer_size_bits = buffer_size_mb * 8 * unit_base * unit_base
     if initial_buffer_fill[:-1] == "%":
@@ -119,14 +118,31 @@ def get_network_requirements_impl(args):
     highest_failed_network_speed = 0 #kbps
     network_speed = int(average_bitrate / unit_base) #kbps
 
+    # Start from an estimate and gallop out from it until the result flips, then bisect
+    if lowest_successful_network_speed - highest_failed_network_speed > 1:
+        estimated_network_speed = estimate_network_speed(frame_sizes, fps, buffer_size_bits, average_bitrate)
+        network_speed = min(max(estimated_network_speed, highest_failed_network_speed + 1), lowest_successful_network_speed - 1)
+
+    step = max(1, network_speed // 50)
+    first_result = None
+    bracketed = False
     while lowest_successful_network_speed - highest_failed_network_speed > 1:
         playback_successful = simulate_playback(frame_sizes, fps, buffer_size_bits, network_speed, initial_buffer_fill_bits)
         if playback_successful:
             lowest_successful_network_speed = min(network_speed, lowest_successful_network_speed)
         else:
             highest_failed_network_speed = max(network_speed, highest_failed_network_speed)
-        
-        network_speed = round((lowest_successful_network_speed + highest_failed_network_speed) / 2)
+
+        if first_result is None:
+            first_result = playback_successful
+        bracketed = bracketed or playback_successful != first_result
+
+        if not bracketed:
+            network_speed += -step if playback_successful else step
+            step *= 2
+
+        if bracketed or not highest_failed_network_speed < network_speed < lowest_successful_network_speed:
+            network_speed = round((lowest_successful_network_speed + highest_failed_network_speed) / 2)
     
     if verbose:
         print(f"{network_speed} Kb/s")
@@ -134,54 +150,67 @@ def get_network_requirements_impl(args):
     return buffer_size_mb, network_speed
 
 
+def estimate_network_speed(frame_sizes, fps, buffer_size_bits, average_bitrate):
+    # Over any run of frames, the network has to deliver whatever the buffer can't already hold,
+    # so the busiest runs of a few lengths around the buffer's duration give a close lower bound
+    running_totals = list(accumulate(frame_sizes, initial=0))
+    num_frames = len(frame_sizes)
+    window = max(1, int(buffer_size_bits / (running_totals[-1] / num_frames)))
+    required_bitrate = average_bitrate
+    while True:
+        window = min(window, num_frames)
+        busiest_window = max(map(sub, running_totals[window:], running_totals))
+        required_bitrate = max(required_bitrate, (busiest_window - buffer_size_bits) / window * fps)
+        if window == num_frames:
+            break
+        window = max(window + 1, int(window * 1.5))
+
+    return int(required_bitrate / unit_base) #kbps
+
+
 def simulate_playback(frame_sizes, fps, buffer_size_bits, network_speed_kbps, init_buffer_bits):
     network_speed_bps = network_speed_kbps * unit_base
 
+    # Frames before stream_position have been downloaded, frames before frames_played have been played,
+    # so the buffer holds every frame in between, plus whatever's arrived of a partially downloaded frame
     total_frames = len(frame_sizes)
     frames_played = 0
-    stream = collections.deque(frame_sizes)
+    stream_position = 0
+    partial_frame_remaining = 0
     bits_per_tick = int(network_speed_bps / fps)
-    buffer = collections.deque()
     partial_frame_in_buffer = False
     playback_begun = False
     buffer_fullness = 0
     while total_frames > frames_played:
         # simulate download
         bits_remaining_in_tick = bits_per_tick
-        while bits_remaining_in_tick > 0 and buffer_fullness < buffer_size_bits:
-            try:
-                frame_to_download = stream.popleft()
-            except IndexError:
-                break
-                
-            if frame_to_download <= bits_remaining_in_tick and buffer_fullness + frame_to_download <= buffer_size_bits:
-                buffer_fullness += frame_to_download
-                bits_remaining_in_tick -= frame_to_download
-
-                if partial_frame_in_buffer:
-                    frame_to_download += buffer.pop()
-                buffer.append(frame_to_download)
-                partial_frame_in_buffer = False
+        while bits_remaining_in_tick > 0 and buffer_fullness < buffer_size_bits and stream_position < total_frames:
+            frame_to_download = partial_frame_remaining if partial_frame_in_buffer else frame_sizes[stream_position]
+
+            # Download as much of the frame as the tick and the space in the buffer allow
+            amount_downloaded = frame_to_download if frame_to_download < bits_remaining_in_tick else bits_remaining_in_tick
+            buffer_space = buffer_size_bits - buffer_fullness
+            if buffer_space < amount_downloaded:
+                amount_downloaded = buffer_space
+            buffer_fullness += amount_downloaded
+            bits_remaining_in_tick -= amount_downloaded
+
+            partial_frame_in_buffer = amount_downloaded < frame_to_download
+            if partial_frame_in_buffer:
+                partial_frame_remaining = frame_to_download - amount_downloaded
             else:
-                amount_downloaded = min(bits_remaining_in_tick, buffer_size_bits - buffer_fullness)
-                buffer_fullness += amount_downloaded
-                bits_remaining_in_tick -= amount_downloaded
-                stream.appendleft(frame_to_download - amount_downloaded)
-                if partial_frame_in_buffer:
-                    amount_downloaded += buffer.pop()
-                buffer.append(amount_downloaded)
-                partial_frame_in_buffer = True
+                stream_position += 1
 
             if buffer_fullness > buffer_size_bits:
                 exit("Buffer overflow")
 
         # simulate playback
 
-        frames_in_buffer = len(buffer)
+        frames_in_buffer = stream_position - frames_played + (1 if partial_frame_in_buffer else 0)
         if not playback_begun:
             playback_begun = frames_in_buffer == total_frames or buffer_fullness == buffer_size_bits or buffer_size_bits >= init_buffer_bits
-        elif frames_in_buffer > 0 and not (frames_in_buffer == 1 and partial_frame_in_buffer) :                    
-            buffer_fullness -= buffer.popleft()
+        elif stream_position > frames_played:
+            buffer_fullness -= frame_sizes[frames_played]
             frames_played += 1
         else:
             return False
@@ -199,11 +228,13 @@ def human_readable_bitrate(bitrate):
         return "0 b/s"
 
     units = ["b/s", "Kb/s", "Mb/s", "Gb/s"]
-    exponent = int(math.log(bitrate) / math.log(unit_base))
-    unit = units[exponent]
-    value = bitrate / math.pow(unit_base, exponent)
+    exponent = 0
+    value = bitrate
+    while value >= unit_base and exponent < len(units) - 1:
+        value /= unit_base
+        exponent += 1
 
-    return f"{value:.2f} {unit}"
+    return f"{value:.2f} {units[exponent]}"
 
 
 def human_readable_size(size_in_bits):
@@ -211,32 +242,46 @@ def human_readable_size(size_in_bits):
         return "0 B"
     
     units = ["B", "KB", "MB", "GB"]
-    size_in_bytes = size_in_bits / 8
-
-    exponent = int(math.log(size_in_bytes) / math.log(unit_base))
-    unit = units[exponent]
-    value = size_in_bytes / math.pow(unit_base, exponent)
+    exponent = 0
+    value = size_in_bits / 8
+    while value >= unit_base and exponent < len(units) - 1:
+        value /= unit_base
+        exponent += 1
 
-    return f"{value:.2f} {unit}"
+    return f"{value:.2f} {units[exponent]}"
 
 
-def scan_media(input_file):
+def get_frame_rate(input_file):
     command = [
         "ffprobe",
         "-loglevel", "quiet",
         "-select_streams", "v:0",
-        "-show_entries", "stream=avg_frame_rate:packet=size",
+        "-show_entries", "stream=avg_frame_rate",
         "-print_format", "json",
         input_file
     ]
 
     output = run(command, stdout=PIPE, stderr=DEVNULL).stdout
-    return json.loads(output)
+    return float(Fraction(json.loads(output)["streams"][0]["avg_frame_rate"]))
+
+
+def get_frame_sizes(input_file):
+    command = [
+        "ffprobe",
+        "-loglevel", "quiet",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=size",
+        "-print_format", "csv=p=0",
+        input_file
+    ]
+
+    output = run(command, stdout=PIPE, stderr=DEVNULL).stdout
+    return array("q", [int(size) * 8 for size in output.split()]) # ffmpeg counts in bytes, we want bits
 
 
 def round(number):
     # Python rounds half even by default, which is good for statistics but it means the calculated required bitrate will be 1kbps too low half the time
-    return int(Decimal(number).quantize(Decimal("1."), ROUND_HALF_UP))
+    return int(number + 0.5) if number >= 0 else -int(-number + 0.5)
 
 
 if __name__ == "__main__":
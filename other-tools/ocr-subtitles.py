@@ -125,7 +125,7 @@ class SubtitleOCR:
         ]
 
         if self.debug:
-            std_err.print(" ".join(map(lambda x: shlex.quote(str(x)), command)))
+            std_err.print(shlex.join(map(str, command)))
 
         run(command, stdout=DEVNULL, stderr=DEVNULL)
 
@@ -138,7 +138,7 @@ class SubtitleOCR:
         command: list[str | Path] = ["macSubtitleOCR", subtitle_file, output_dir, "-i"]
 
         if self.debug:
-            std_err.print(" ".join(map(lambda x: shlex.quote(str(x)), command)))
+            std_err.print(shlex.join(map(str, command)))
 
         run(command)
         srt_file = output_dir / "track_1.srt"
@@ -7,7 +7,6 @@ import csv
 import shlex
 from argparse import ArgumentParser
 from asyncio.subprocess import DEVNULL, PIPE
-from io import StringIO
 from subprocess import Popen
 
 TITLE_NAME = 2
@@ -59,16 +58,13 @@ class Ripper:
             "info", "disc:0"]
 
         if self.debug:
-            print(" ".join(map(lambda x: shlex.quote(x), command)))
+            print(shlex.join(command))
 
         titles = []
         current_title = None
-        with Popen(command, stdout=PIPE, stderr=DEVNULL) as p:
-            while True:
-                if p.poll() is not None:
-                    break
-
-                line = p.stdout.readline().decode().strip()
+        with Popen(command, stdout=PIPE, stderr=DEVNULL, text=True, encoding="utf-8", bufsize=1) as p:
+            for line in p.stdout:
+                line = line.strip()
                 if self.debug and line:
                     print(line)
 
@@ -107,14 +103,11 @@ class Ripper:
             "."]
 
         if self.debug:
-            print(" ".join(map(lambda x: shlex.quote(x), command)))
-
-        with Popen(command, stdout=PIPE, stderr=DEVNULL) as p:
-            while True:
-                if p.poll() is not None:
-                    break
+            print(shlex.join(command))
 
-                line = p.stdout.readline().decode().strip()
+        with Popen(command, stdout=PIPE, stderr=DEVNULL, text=True, encoding="utf-8", bufsize=1) as p:
+            for line in p.stdout:
+                line = line.strip()
                 if self.debug and line:
                     print(line)
 
@@ -129,15 +122,14 @@ class Ripper:
             _, _, message = self.csv_split(line)
             print(message)
         elif prefix == "PRGV":
-            current, _, max = [ int(x) for x in self.csv_split(line) ]
+            # PRGV is always three plain integers, so skip the csv module
+            current, _, max = [ int(x) for x in line.split(",", 2) ]
             progress = current / max * 100
             print(f"Progress: {progress:.2f}%", end="\r")
 
 
     def csv_split(self, string):
-        with StringIO(string) as s:
-            reader = csv.reader(s)
-            return next(reader)
+        return next(csv.reader([string]))
 
 
 class Title:
@@ -5,8 +5,13 @@
 import os
 import shlex
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from subprocess import Popen, PIPE, run, DEVNULL, CalledProcessError
 
+PREFETCH_FRAMES = 8
+
 
 def main():
     parser = ArgumentParser()
@@ -59,14 +64,20 @@ class Stitcher:
                    "-c:v", "copy",
                    output]
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        print(shlex.join(command))
         if self.dryrun:
             exit()
 
         ffmpeg = Popen(command, stdin=PIPE)
-        for frame in frames:
-            with open(frame, "rb") as f:
-                ffmpeg.stdin.write(f.read())
+        # Read the next few frames on another thread, so the disk isn't idle while ffmpeg takes the current one
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            upcoming_frames = iter(frames)
+            pending_reads = deque(executor.submit(self.__read_frame, frame)
+                                  for frame in islice(upcoming_frames, PREFETCH_FRAMES))
+            while pending_reads:
+                ffmpeg.stdin.write(pending_reads.popleft().result())
+                if (frame := next(upcoming_frames, None)) is not None:
+                    pending_reads.append(executor.submit(self.__read_frame, frame))
 
         ffmpeg.stdin.close()
         ffmpeg.wait()
@@ -79,13 +90,17 @@ class Stitcher:
         except CalledProcessError:
             exit(f"Unable to run ffmpeg")
 
+    @staticmethod
+    def __read_frame(frame):
+        with open(frame, "rb") as f:
+            return f.read()
+
     def __scan_media(self, input_folder) -> list[str]:
         frames = list[str]()
         for root, dirs, files in os.walk(input_folder):
             dirs.sort()
             for file in sorted(files):
-                extension = os.path.splitext(file)[1].lower()
-                if extension in [".jpg", ".jpeg"]:
+                if file.lower().endswith((".jpg", ".jpeg")):
                     frames.append(os.path.join(root, file))
                 elif self.debug:
                     print(f"Rejecting {os.path.join(root, file)}")
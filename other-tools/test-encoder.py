@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
+import hashlib
 import json
 import os
-import re
 import shlex
 from argparse import ArgumentParser
 from subprocess import PIPE, Popen, TimeoutExpired, run, CalledProcessError
 from sys import exit, stdout
 
+SCAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transcoding-tools")
+
 
 def main():
     parser = ArgumentParser(
@@ -74,28 +76,27 @@ class Transcoder:
             "--input", input_file,
             "--output", output_file,
             "--previews", "1",
-            "--markers"
+            "--markers",
+            *self.__get_picture_args(media_info),
+            *self.__get_audio_args(media_info),
+            *self.__get_subtitle_args(media_info),
+            *self.video_args
         ]
 
-        command += self.__get_picture_args(media_info)
-        command += self.__get_audio_args(media_info)
-        command += self.__get_subtitle_args(media_info)
-        command += self.video_args
-
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        command_line = shlex.join(command)
+        print(command_line)
 
         if self.dryrun:
             exit()
 
         with open(f"{output_file}.log", "wb") as logfile:
-            logfile.write((" ".join(map(lambda x: shlex.quote(x), command)) + "\n\n").encode("utf-8"))
+            logfile.write(f"{command_line}\n\n".encode("utf-8"))
 
             with Popen(command, stderr=PIPE) as p:
-                for line in p.stderr:
-                    stdout.buffer.write(line)
+                while chunk := os.read(p.stderr.fileno(), 65536):
+                    stdout.buffer.write(chunk)
                     stdout.buffer.flush()
-                    logfile.write(line)
-                    logfile.flush()
+                    logfile.write(chunk)
 
                 try:
                     p.wait()
@@ -114,44 +115,79 @@ class Transcoder:
                     pass
 
     def __scan_media(self, input_file):
-        def basic_scan(previews=10):
-            scan_command = ["HandBrakeCLI",
-                            "--json",
-                            "--scan",
-                            "--crop-mode", "conservative",
-                            "--previews", str(previews),
-                            "--input", input_file]
-
-            command_output = run(scan_command, stdout=PIPE, stderr=PIPE)
-            json_scan_result = command_output.stdout.partition(b"JSON Title Set:")[2]
-
-            if not json_scan_result:
-                exit("Scan failed")
-
-            full_media_info = json.loads(json_scan_result)
-            main_title = full_media_info["MainFeature"]
-            return command_output, full_media_info["TitleList"][main_title]
-
-        hb_scan_info, media_info = basic_scan()
+        media_info = self.__basic_scan(input_file)
         if self.crop == "auto":
             print("Detecting crop...")
             duration = media_info["Duration"]
             duration = (duration["Hours"] * 60 * 60) + (duration["Minutes"] * 60) + duration["Seconds"]
             num_previews = int(duration / 60 * 5)
-            hb_scan_info, media_info = basic_scan(num_previews)
+            media_info = self.__basic_scan(input_file, num_previews)
+
+        return media_info
+
+    def __basic_scan(self, input_file, previews=1):
+        # Cached until the source's size or modification time changes
+        cache_file = self.__get_scan_cache_file(input_file, previews)
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                try:
+                    return json.load(f)
+                except ValueError as e:
+                    print(e)
+
+        scan_command = ["HandBrakeCLI",
+                        "--json",
+                        "--scan",
+                        "--crop-mode", "conservative",
+                        "--previews", str(previews),
+                        "--input", input_file]
+
+        command_output = run(scan_command, stdout=PIPE, stderr=PIPE)
+        json_scan_result = command_output.stdout.partition(b"JSON Title Set:")[2]
+
+        if not json_scan_result:
+            exit("Scan failed")
+
+        full_media_info = json.loads(json_scan_result)
+        main_title = full_media_info["MainFeature"]
+        media_info = full_media_info["TitleList"][main_title]
 
         # Can't trust HandBrake's default InterlaceDetected behaviour, we need to check ourselves
-        interlaced = False
-        video_line_regex = re.compile(b"^.*?Stream.*?Video.*$", re.MULTILINE)
-        regex_result = video_line_regex.search(hb_scan_info.stderr)
-        if regex_result:
-            start, end = regex_result.span()
-            video_line = hb_scan_info.stderr[start:end]
-            interlaced = b"top first" in video_line or b"bottom first" in video_line
-
-        media_info["InterlaceDetected"] = interlaced
+        media_info["InterlaceDetected"] = self.__is_interlaced(command_output.stderr)
+
+        self.__save_scan(cache_file, media_info)
         return media_info
 
+    @staticmethod
+    def __get_scan_cache_file(input_file, previews):
+        stat = os.stat(input_file)
+        cache_key = f"{os.path.abspath(input_file)}:{stat.st_mtime_ns}:{stat.st_size}:{previews}"
+        return os.path.join(SCAN_CACHE_DIR, hashlib.sha256(cache_key.encode("utf-8")).hexdigest() + ".json")
+
+    @staticmethod
+    def __save_scan(cache_file, media_info):
+        os.makedirs(SCAN_CACHE_DIR, exist_ok=True)
+        with open(f"{cache_file}.tmp", "w") as f:
+            json.dump(media_info, f)
+        os.replace(f"{cache_file}.tmp", cache_file)
+
+    @staticmethod
+    def __is_interlaced(scan_log):
+        position = scan_log.find(b"Stream")
+        while position != -1:
+            # The video stream line is the first one with "Video" somewhere after "Stream"
+            line_end = scan_log.find(b"\n", position)
+            if line_end == -1:
+                line_end = len(scan_log)
+
+            if scan_log.find(b"Video", position, line_end) != -1:
+                video_line = scan_log[scan_log.rfind(b"\n", 0, position) + 1:line_end]
+                return b"top first" in video_line or b"bottom first" in video_line
+
+            position = scan_log.find(b"Stream", line_end)
+
+        return False
+
     def __get_picture_args(self, media_info):
         if self.crop == "auto":
             crop = ":".join([str(x) for x in media_info["Crop"]])
@@ -200,12 +236,9 @@ class Transcoder:
 
     @staticmethod
     def __get_subtitle_args(media_info):
-        added_subtitles = []
-        forced_subtitle = None
-        for subtitle in media_info["SubtitleList"]:
-            added_subtitles.append(str(subtitle["TrackNumber"]))
-            if not forced_subtitle and subtitle["Attributes"]["Forced"]:
-                forced_subtitle = str(subtitle["TrackNumber"])
+        subtitles = media_info["SubtitleList"]
+        added_subtitles = [str(subtitle["TrackNumber"]) for subtitle in subtitles]
+        forced_subtitle = next((str(subtitle["TrackNumber"]) for subtitle in subtitles if subtitle["Attributes"]["Forced"]), None)
 
         if added_subtitles:
             subtitle_args = [
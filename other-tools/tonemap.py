@@ -40,7 +40,11 @@ class Transcoder:
         if not self.dryrun and os.path.exists(output_file):
             exit(f"Output file exists: {output_file}")
 
-        media_info = self.__scan_media(input_file)
+        # HDR side data is nearly always on the very first frame, so only read further in when it isn't
+        media_info = self.__scan_media(input_file, 1)
+        first_frame = self.__get_first_video_frame(media_info)
+        if not first_frame or "side_data_list" not in first_frame:
+            media_info = self.__scan_media(input_file, 50)
 
         if self.debug:
             pprint(media_info)
@@ -54,7 +58,7 @@ class Transcoder:
             *self.__video_args(media_info),
             output_file]
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        print(shlex.join(command))
 
         if self.dryrun:
             exit()
@@ -62,41 +66,47 @@ class Transcoder:
         run(command)
 
     @staticmethod
-    def __scan_media(input_file):
+    def __scan_media(input_file, frames):
         command = [
             "ffprobe",
             "-loglevel", "error",
             "-show_streams",
             "-show_format",
             "-show_frames",
-            "-read_intervals", "%+#50",
+            "-read_intervals", f"%+#{frames}",
             "-print_format", "json",
             input_file]
 
         return json.loads(run(command, stdout=PIPE, stderr=DEVNULL).stdout)
 
+    @staticmethod
+    def __get_first_video_frame(media_info):
+        for frame in media_info.get("frames", []):
+            if frame["media_type"] == "video":
+                return frame
+
+        return None
+
     def __picture_args(self, media_info):
         ## filters. Tonemap, crop, scale, overlay?
 
-        first_frame = None
-        for frame in media_info["frames"]:
-            if frame["media_type"] == "video":
-                first_frame = frame
-                break
-
+        first_frame = self.__get_first_video_frame(media_info)
         if not first_frame:
             exit("Unable to read video frame data")
 
+        # Reversed so the first entry of each type wins
+        side_data = {x["side_data_type"]: x for x in reversed(first_frame.get("side_data_list", []))}
+
         try:
-            signal_peak = int([x for x in first_frame["side_data_list"] if x["side_data_type"] == "Content light level metadata"][0]["max_content"])
+            signal_peak = int(side_data["Content light level metadata"]["max_content"])
             print(signal_peak)
-        except:
+        except (KeyError, TypeError, ValueError):
             signal_peak = None
 
         if not signal_peak:
             try:
-                signal_peak = int([x for x in first_frame["side_data_list"] if x["side_data_type"] == "Mastering display metadata"][0]["max_luminance"])
-            except:
+                signal_peak = int(side_data["Mastering display metadata"]["max_luminance"])
+            except (KeyError, TypeError, ValueError):
                 signal_peak = None
 
         if not signal_peak or signal_peak < 1:
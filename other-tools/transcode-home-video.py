@@ -4,7 +4,8 @@ import json
 import os
 import tempfile
 from argparse import ArgumentParser
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, repeat
 from subprocess import DEVNULL, PIPE, run, CalledProcessError
 from sys import exit
 import shlex
@@ -27,16 +28,28 @@ def main():
                                 help="print `ffmpeg` command and exit")
 
     other_options = parser.add_argument_group("Other Options")
+    other_options.add_argument("-j", "--jobs", type=int, default=1, help="number of files to transcode at once. Default: 1")
     other_options.add_argument("--debug", action="store_true", help="turn on debugging output")
     other_options.add_argument("-h", "--help", action="help", help="print this message and exit")
 
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        exit("--jobs must be at least 1")
+
+    if args.jobs > 1 and len(args.file) > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            list(executor.map(_transcode, args.file, repeat(args.debug), repeat(args.dry_run)))
+    else:
+        for file in args.file:
+            _transcode(file, args.debug, args.dry_run)
+
+
+def _transcode(file, debug, dry_run):
     transcoder = Transcoder()
-    transcoder.debug = args.debug
-    transcoder.dry_run = args.dry_run
-    for file in args.file:
-        transcoder.transcode(file)
+    transcoder.debug = debug
+    transcoder.dry_run = dry_run
+    transcoder.transcode(file)
 
 
 class Transcoder:
@@ -72,7 +85,7 @@ class Transcoder:
             output_file
         ]
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        print(shlex.join(command))
 
         if self.dry_run:
             return
@@ -111,7 +124,7 @@ class Transcoder:
 
         if self.debug:
             print("Frame info")
-            pprint.pprint(stream_info)
+            pprint.pprint(frame_info)
             print("---")
 
         return stream_info["streams"], frame_info["frames"][0]
@@ -196,27 +209,27 @@ class Transcoder:
             "-bufsize:v", "12000k"]
 
     def __get_audio_args(self, stream_info):
-        audio_args = []
-
         audio_streams = [x for x in stream_info if x["codec_type"] == "audio"]
+        audio_args = list(chain.from_iterable(self.__get_audio_stream_args(i, audio) for i, audio in enumerate(audio_streams)))
 
-        for i, audio in enumerate(audio_streams):
-            if audio["channels"] > 2:
-                audio_args += [
-                    f"-ac:a:{i}", "2",
-                    f"-c:a:{i}", "aac_at"]
-            elif audio["codec_name"] != "aac":
-                audio_args += [f"-c:a:{i}", "aac_at"]
-            else:
-                audio_args += [f"-c:a:{i}", "copy"]
-            
-            audio_args += [f"-metadata:s:a:{i}", "language=eng"]
-        
         if self.debug:
             print(audio_args)
 
         return audio_args
 
+    @staticmethod
+    def __get_audio_stream_args(i, audio):
+        if audio["channels"] > 2:
+            codec_args = [
+                f"-ac:a:{i}", "2",
+                f"-c:a:{i}", "aac_at"]
+        elif audio["codec_name"] != "aac":
+            codec_args = [f"-c:a:{i}", "aac_at"]
+        else:
+            codec_args = [f"-c:a:{i}", "copy"]
+
+        return [*codec_args, f"-metadata:s:a:{i}", "language=eng"]
+
 
 if __name__ == "__main__":
     main()
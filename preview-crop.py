@@ -3,12 +3,15 @@
 # requires ffprobe, ffmpeg, and mpv
 
 from argparse import ArgumentParser
-from subprocess import run, DEVNULL, PIPE
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError, Popen, run, DEVNULL, PIPE
 import json
 import re
 import os
 from pathlib import Path
 
+CROP_REGEX = re.compile(".*crop=([0-9]+):([0-9]+):([0-9]+):([0-9]+)")
+
 def main():
     parser = ArgumentParser()
     parser.add_argument("file")
@@ -95,49 +98,16 @@ class CropDetector:
         ignore_count = 0
 
         path = media_info["format"]["filename"]
+        playlist = None
         if path.startswith("bluray:"):
             playlist = int(os.path.splitext(os.path.basename(file))[0])
 
-        for step in range(1, steps + 1):
-            s_crop = all_crop.copy()
-            position = interval * step
-
-            # ffmpeg ... -playlist <number> -i bluray:// ...
-            command = [
-                "ffmpeg",
-                "-hide_banner",
-                "-nostdin",
-                "-noaccurate_seek",
-                "-ss", str(position),
-                *(["-playlist", str(playlist)] if path.startswith("bluray") else []),
-                "-i", path,
-                "-frames:v", "15",
-                "-filter:v", "cropdetect=24.0/255:2",
-                "-an",
-                "-sn",
-                "-ignore_unknown",
-                "-f", "null",
-                "-"
-            ]
-
-            result = run(command, stdout=DEVNULL, stderr=PIPE).stderr.decode("utf-8")
-            for line in result.splitlines():
-                pattern = re.compile(".*crop=([0-9]+):([0-9]+):([0-9]+):([0-9]+)")
-                match = pattern.match(line)
-                if match:
-                    d_width, d_height, d_x, d_y = match.groups()
-                    if s_crop["width"] < int(d_width):
-                        s_crop["width"] = int(d_width)
-
-                    if s_crop["height"] < int(d_height):
-                        s_crop["height"] = int(d_height)
-
-                    if s_crop["x"] > int(d_x):
-                        s_crop["x"] = int(d_x)
-
-                    if s_crop["y"] > int(d_y):
-                        s_crop["y"] = int(d_y)
+        # The ignore count depends on the order of the samples, so combine them in order
+        positions = [interval * step for step in range(1, steps + 1)]
+        with ThreadPoolExecutor(max_workers=min(steps, os.cpu_count() or 1)) as executor:
+            samples = list(executor.map(lambda position: self.__sample_crop(path, playlist, position, all_crop), positions))
 
+        for s_crop in samples:
             if s_crop == no_crop and last_crop != no_crop:
                 ignore_count += 1
             else:
@@ -160,6 +130,47 @@ class CropDetector:
 
         return Crop(width, height, crop["width"], crop["height"], crop["x"], crop["y"])
 
+    @staticmethod
+    def __sample_crop(path, playlist, position, all_crop):
+        s_crop = all_crop.copy()
+
+        # ffmpeg ... -playlist <number> -i bluray:// ...
+        command = [
+            "ffmpeg",
+            "-hide_banner",
+            "-nostdin",
+            "-noaccurate_seek",
+            "-ss", str(position),
+            *(["-playlist", str(playlist)] if playlist is not None else []),
+            "-i", path,
+            "-frames:v", "15",
+            "-filter:v", "cropdetect=24.0/255:2",
+            "-an",
+            "-sn",
+            "-ignore_unknown",
+            "-f", "null",
+            "-"
+        ]
+
+        with Popen(command, stdout=DEVNULL, stderr=PIPE, text=True, encoding="utf-8") as p:
+            for line in p.stderr:
+                match = CROP_REGEX.match(line)
+                if match:
+                    d_width, d_height, d_x, d_y = match.groups()
+                    if s_crop["width"] < int(d_width):
+                        s_crop["width"] = int(d_width)
+
+                    if s_crop["height"] < int(d_height):
+                        s_crop["height"] = int(d_height)
+
+                    if s_crop["x"] > int(d_x):
+                        s_crop["x"] = int(d_x)
+
+                    if s_crop["y"] > int(d_y):
+                        s_crop["y"] = int(d_y)
+
+        return s_crop
+
     def __verify_tools(self):
         commands = [
             ["ffprobe", "-version"],
@@ -167,12 +178,21 @@ class CropDetector:
             ["mpv", "-version"]
         ]
 
-        for command in commands:
-            try:
-                run(command, stdout=DEVNULL, stderr=DEVNULL).check_returncode()
-            except:
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            results = list(executor.map(self.__can_run, commands))
+
+        for command, can_run in zip(commands, results):
+            if not can_run:
                 exit(f"Unable to run {command[0]}")
 
+    @staticmethod
+    def __can_run(command):
+        try:
+            run(command, stdout=DEVNULL, stderr=DEVNULL).check_returncode()
+            return True
+        except (OSError, CalledProcessError):
+            return False
+
     def __scan_media(self, input_file):
         command = [
             "ffprobe",
@@ -61,7 +61,7 @@ class Remuxer:
 
         command += [input_file]
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        print(shlex.join(command))
 
         if not self.dryrun:
             run(command)
@@ -6,9 +6,17 @@ import re
 import shlex
 import shutil
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from subprocess import DEVNULL, PIPE, Popen, run
 from sys import exit, stderr
+from threading import Event
 from pathlib import Path
+from stat import S_ISDIR
+
+HANDBRAKE_VERSION_REGEX = re.compile("\\d\\.\\d\\.\\d")
+HANDBRAKE_NIGHTLY_REGEX = re.compile("\\d{14}-.*")
+VIDEO_LINE_REGEX = re.compile(rb"Stream[^\n]*Video[^\n]*")
 
 
 def main():
@@ -92,6 +100,12 @@ def __create_transcoder(args):
     return transcoder
 
 
+@lru_cache(maxsize=None)
+def _handbrake_output(option):
+    # The HandBrake install doesn't change during a run, so every Transcoder can share these
+    return run(["HandBrakeCLI", option], stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout
+
+
 class Transcoder:
     def __init__(self):
         self.output_name = None
@@ -114,23 +128,22 @@ class Transcoder:
         self.__handbrake_video_encoders = None
 
     def transcode(self, input_file):
-        if not os.path.exists(input_file):
+        try:
+            input_stat = os.stat(input_file)
+        except OSError:
             exit(f"No such file: {input_file}")
 
-        if os.path.isdir(input_file):
+        if S_ISDIR(input_stat.st_mode):
             exit("Folder inputs are not supported")
 
         if self.output_name:
             output_file = f"{self.output_name}.mkv"
         else:
-            output_file = os.path.splitext(os.path.basename(input_file))[0] + ".mkv"
+            output_file = Path(input_file).stem + ".mkv"
         
         if not self.dryrun and os.path.exists(output_file):
             exit(f"Output file exists: {output_file}")
 
-        self.__check_tools()
-        media_info = self.__scan_media(input_file)
-
         if not self.crop:
             crop_file = os.path.join(os.path.dirname(input_file), "crop.txt")
             if os.path.exists(crop_file):
@@ -139,12 +152,21 @@ class Transcoder:
 
                 print("Taking crop from crop.txt")
 
+        # The tool check doesn't depend on the scan, so let the two overlap
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            check_tools = executor.submit(self.__check_tools)
+            try:
+                media_info = self.__scan_media(input_file, detect_crop=self.crop == "auto")
+            finally:
+                # an unsupported HandBrake is more useful to report than whatever that did to the scan
+                check_tools.result()
+
         command = [
             "HandBrakeCLI",
             "--keep-duplicate-titles",
             "--no-dvdnav",
             "--output", output_file,
-            "--previews", "1",
+            "--previews", "1",  # crop is always passed explicitly, so don't let HandBrake default to 10 previews
             "--markers"
         ]
 
@@ -163,12 +185,14 @@ class Transcoder:
         command += audio_args
         command += self.__get_subtitle_args(media_info, audio_lang)
 
-        print(" ".join(map(lambda x: shlex.quote(x), command)))
+        command_line = shlex.join(command)
+        print(command_line)
 
         if self.dryrun:
             return
 
-        with open(f"{output_file}.log", "wb+") as logfile:
+        with open(f"{output_file}.log", "wb", buffering=64 * 1024) as logfile:
+            logfile.write(f"{command_line}\n\n".encode("utf-8"))
             self.__run_handbrake(media_info, command, output_file, logfile)
             self.__run_mkvpropedit(output_file)
 
@@ -176,31 +200,28 @@ class Transcoder:
         # Require HandBrake 1.6.1+
         # Allow nightlies, but behaviour with them is undefined
 
-        version_command = ["HandBrakeCLI", "--version"]
-        hb_version = run(version_command, stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout.removeprefix(
-            "HandBrake").strip()
+        hb_version = _handbrake_output("--version").removeprefix("HandBrake").strip()
         if self.debug:
             print("HandBrake version line: " + hb_version)
 
-        if re.match("\\d\\.\\d\\.\\d", hb_version):
+        if HANDBRAKE_VERSION_REGEX.match(hb_version):
             major, minor, patch = 1, 9, 0
             hb_major, hb_minor, hb_patch = [int(x) for x in hb_version.split(".")]
-            if hb_major > major or (hb_major == major and hb_minor > minor) or (
-                    hb_major == major and hb_minor == minor and hb_patch >= patch):
+            if (hb_major, hb_minor, hb_patch) >= (major, minor, patch):
                 print(f"Found HandBrake {hb_version}")
             else:
                 exit(f"Unsupported version of HandBrake: {hb_version}, requires version >= {major}.{minor}.{patch}")
-        elif re.match("\\d{14}-.*", hb_version):
+        elif HANDBRAKE_NIGHTLY_REGEX.fullmatch(hb_version):
             year, month, day = 2024, 10, 13  # 1eead5a9eaa9203da6f4d3c8368b9a461f687adc
             hb_year, hb_month, hb_day = int(hb_version[:4]), int(hb_version[4:6]), int(hb_version[6:8])
-            if hb_year > year or (hb_year == year and hb_month > month) or (hb_year == year and hb_month == month and hb_day >= day):
+            if (hb_year, hb_month, hb_day) >= (year, month, day):
                 print(f"Found HandBrake {hb_version}")
             else:
                 exit(f"Unsupported nightly: {hb_version}, requires builds since {year}-{month}-{day}")
         else:
             print(f"WARN: Unable to check HandBrake version ({hb_version})")
 
-        handbrake_help = run(["HandBrakeCLI", "--help"], stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout
+        handbrake_help = _handbrake_output("--help")
         self.__handbrake_audio_encoders = [x.strip() for x in handbrake_help.partition("Select audio encoder(s):")[2].partition("\"")[0].splitlines()]
         self.__handbrake_video_encoders = [x.strip() for x in handbrake_help.partition("Select video encoder:")[2].partition("--")[0].splitlines()]
 
@@ -208,12 +229,13 @@ class Transcoder:
             print(f"{self.__handbrake_audio_encoders=}")
             print(f"{self.__handbrake_video_encoders=}")
 
-    def __scan_media(self, input_file):
+    def __scan_media(self, input_file, detect_crop=False):
         if input_file.endswith(".mpls"):
             input_folder = Path(input_file).parent.parent.parent
             title = self.__get_handbrake_title(input_file)
 
-        def basic_scan(previews=10):
+        # Previews are only needed for crop detection, so keep the first scan as cheap as possible
+        def basic_scan(previews=1):
             scan_command = ["HandBrakeCLI",
                             "--json",
                             "--scan",
@@ -228,8 +250,20 @@ class Transcoder:
             else:
                 scan_command += ["--input", input_file]
 
-            command_output = run(scan_command, stdout=PIPE, stderr=PIPE)
-            json_scan_result = command_output.stdout.partition(b"JSON Title Set:")[2]
+            # The scan log can be huge, and only the video stream line is needed from it, so pick that out
+            # as the log streams past. stdout is read on another thread so neither pipe can fill up and stall
+            with Popen(scan_command, stdout=PIPE, stderr=PIPE) as p, ThreadPoolExecutor(max_workers=1) as executor:
+                scan_output = executor.submit(p.stdout.read)
+
+                video_line = None
+                for line in p.stderr:
+                    # nearly every line fails the substring test, which is much cheaper than the regex
+                    if video_line is None and b"Video" in line:
+                        regex_result = VIDEO_LINE_REGEX.search(line)
+                        if regex_result:
+                            video_line = regex_result.group()
+
+                json_scan_result = scan_output.result().partition(b"JSON Title Set:")[2]
 
             if self.debug:
                 print("Json output: " + json_scan_result.decode())
@@ -239,22 +273,18 @@ class Transcoder:
 
             full_media_info = json.loads(json_scan_result)
             main_title = full_media_info["MainFeature"]
-            return command_output, full_media_info["TitleList"][main_title]
+            return video_line, full_media_info["TitleList"][main_title]
 
-        hb_scan_info, media_info = basic_scan()
-        if self.crop == "auto":
+        video_line, media_info = basic_scan()
+        if detect_crop:
             print("Detecting crop...")
             duration = self.__get_duration_seconds(media_info)
             num_previews = int(duration / 60 * 5)
-            hb_scan_info, media_info = basic_scan(num_previews)
+            video_line, media_info = basic_scan(num_previews)
 
         # Can't trust HandBrake's default InterlaceDetected behaviour, we need to check ourselves
         interlaced = False
-        video_line_regex = re.compile(b"^.*?Stream.*?Video.*$", re.MULTILINE)
-        regex_result = video_line_regex.search(hb_scan_info.stderr)
-        if regex_result:
-            start, end = regex_result.span()
-            video_line = hb_scan_info.stderr[start:end]
+        if video_line:
             if self.debug:
                 print("Video Line: " + video_line.decode())
             interlaced = b"top first" in video_line or b"bottom first" in video_line
@@ -566,17 +596,22 @@ class Transcoder:
         return subtitle_args
     
     def __run_handbrake(self, media_info, command, output_file, logfile):
-        logfile.write((" ".join(map(lambda x: shlex.quote(x), command)) + "\n\n").encode("utf-8"))
-
-        with Popen(command, stderr=PIPE) as p:
+        # HandBrake logs a lot, don't flush on every line. Flushing on a timer instead means output
+        # still shows up while HandBrake is quiet, which it can be for most of an encode
+        with Popen(command, stderr=PIPE) as p, ThreadPoolExecutor(max_workers=1) as executor:
+            finished = Event()
+            executor.submit(self.__flush_until, finished, stderr.buffer, logfile)
             last_line = None
-            for line in p.stderr:
-                last_line = line
-                stderr.buffer.write(line)
-                stderr.buffer.flush()
-                logfile.write(line)
-                logfile.flush()
-            
+            try:
+                for line in p.stderr:
+                    last_line = line
+                    stderr.buffer.write(line)
+                    logfile.write(line)
+            finally:
+                finished.set()
+
+            stderr.buffer.flush()
+            logfile.flush()
             p.wait()
             clean_exit = b"HandBrake has exited.\n" == last_line
             if not clean_exit or p.returncode != 0:
@@ -592,6 +627,12 @@ class Transcoder:
         if input_duration != output_duration:
             print(f"WARNING: Output file duration doesn't match input file duration. {input_duration} vs {output_duration}")
 
+    @staticmethod
+    def __flush_until(finished, *streams):
+        while not finished.wait(0.5):
+            for stream in streams:
+                stream.flush()
+
     @staticmethod
     def __run_mkvpropedit(output_file):
         if os.path.exists(output_file) and shutil.which("mkvpropedit"):